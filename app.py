@@ -1,176 +1,520 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+import bisect
 import datetime
+import functools
+import html
+import json
+import os
+from operator import itemgetter
+
+try:
+    import orjson  # C-implemented; ~3-5x faster on these dict payloads
+except ImportError:
+    orjson = None
+from string import Template
+import threading
 import time
+from collections import deque
+import numpy as np
 import streamlit.components.v1 as components
+from streamlit_autorefresh import st_autorefresh
+
+# UAE has no DST, so a fixed-offset tzinfo built once at import is all we
+# need — no per-call zone-file lookup on the rerun path.
+UAE_TZ = datetime.timezone(datetime.timedelta(hours=4), name="Asia/Dubai")
+
+def get_now():
+    return datetime.datetime.now(UAE_TZ)
+
+def fmt_hm(dt):
+    """Fixed 'HH:MM' rendering without the strftime format-parsing trip."""
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+@functools.lru_cache(maxsize=64)
+def split_topics(raw):
+    """One place that turns the comma-separated topics field into clean
+    names. Returns a tuple so the result is hashable (it feeds cache
+    keys) and so repeat clicks on unchanged text are an lru_cache hit."""
+    return tuple(t.strip() for t in raw.split(",") if t.strip())
+
+def make_task(task_id, kind, topic, when):
+    """The one definition of the task row schema. Every producer builds
+    rows here, so the monitor's column extraction can rely on identical
+    fields (including the precomputed Ts/DisplayTime) everywhere."""
+    return {
+        "id": task_id,
+        "Type": kind,
+        "Topic": topic,
+        "Time": when,
+        "Ts": when.timestamp(),
+        "DisplayTime": fmt_hm(when),
+        "Status": "Pending",
+        "Reminded": False,
+    }
+
+@st.cache_resource(show_spinner=False)
+def ai_response_cache():
+    """Process-wide memo of completed Gemini answers. Living behind
+    cache_resource makes it one dict shared by every session, so any
+    user asking an already-answered question gets the stored text."""
+    return {}
+
+# Gemini free-tier budget: at most this many API calls per sliding minute
+# across every session in the process.
+GEMINI_CALLS_PER_MIN = 10
+
+@st.cache_resource(show_spinner=False)
+def gemini_call_gate():
+    """Process-wide guard for the Gemini miss path: a sliding-window
+    deque of recent call times enforces the rate budget, and the
+    in-flight set coalesces concurrent identical misses so N sessions
+    asking the same question fire one request, not N."""
+    return {"lock": threading.Lock(), "calls": deque(), "in_flight": set()}
+
+def show_study_suggestions(topics):
+    """Stream the Gemini breakdown into the UI so the script is not
+    blocked on the full response. Completed answers are remembered under
+    a (topics, hour bucket) key, so repeats within the hour replay
+    instantly with no API round-trip."""
+    # Normalized key: re-ordering, re-casing, or re-spacing the topic
+    # list is the same question, so it must not trigger a new API call.
+    bucket = int(time.time() // 3600)
+    key = (tuple(sorted(t.casefold() for t in topics)), bucket)
+    cache = ai_response_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        st.info(cached)
+        return
+
+    gate = gemini_call_gate()
+    with gate["lock"]:
+        # Coalesce: if another session is already streaming this exact
+        # answer, don't issue a duplicate request — the memo will have
+        # it momentarily.
+        if key in gate["in_flight"]:
+            st.info("That breakdown is being generated right now — ask again in a moment.")
+            return
+        calls = gate["calls"]
+        cutoff = time.time() - 60
+        while calls and calls[0] < cutoff:
+            calls.popleft()
+        if len(calls) >= GEMINI_CALLS_PER_MIN:
+            st.warning("AI budget reached for this minute — please retry shortly.")
+            return
+        calls.append(time.time())
+        gate["in_flight"].add(key)
+        # GC pass on miss: entries from past hour buckets can never hit
+        # again. Every mutation of the shared dict — this sweep and the
+        # insert below — happens under the gate lock, so no thread can
+        # resize it while another iterates.
+        for stale in [k for k in cache if k[1] != bucket]:
+            cache.pop(stale, None)
+
+    try:
+        engine = get_engine()
+        ok = True
+
+        def guarded():
+            nonlocal ok
+            for chunk in engine.stream_ai_breakdown(topics):
+                if engine.is_error_chunk(chunk):
+                    ok = False
+                yield chunk
+
+        text = st.write_stream(guarded())
+        # Only successful answers enter the memo: it is process-wide
+        # and hour-keyed, so caching a transient error would pin that
+        # failure for every session until the bucket rolls. The store
+        # takes the gate lock: an unlocked insert could land while
+        # another session's sweep iterates the dict and blow up that
+        # thread with a resize-during-iteration RuntimeError.
+        if ok:
+            with gate["lock"]:
+                cache[key] = text
+    finally:
+        with gate["lock"]:
+            gate["in_flight"].discard(key)
+
+# --- GEMINI ENGINE (cached once per process, not per rerun) ---
+@st.cache_resource(show_spinner=False)
+def get_engine():
+    """Build the Gemini engine a single time per server process.
+    st.cache_resource is process-global, so every session shares this
+    one engine (and its underlying HTTP connections) rather than each
+    session redoing auth/channel setup. Importing the engine here keeps
+    the heavy google.generativeai SDK off the cold-start path for
+    sessions that never touch an AI button."""
+    from engine import FocusFlowEngine
+    try:
+        api_key = st.secrets["GEMINI_API_KEY"]
+    except (KeyError, FileNotFoundError):
+        api_key = None
+    return FocusFlowEngine(api_key=api_key)
 
 # --- AI ORCHESTRATION LOGIC ---
 class FocusFlowAI:
     @staticmethod
     def generate_full_schedule(topics, deadline, start_hour):
-        """Rule-based AI: Generates study blocks, hydration pings, and breaks."""
-        days_left = (deadline - datetime.date.today()).days
-        if days_left <= 0: days_left = 1
-        
-        per_day = -(-len(topics) // days_left)
+        """Rule-based AI: Generates study blocks, hydration pings, and breaks.
+
+        `deadline` is kept for call compatibility; slots are laid out
+        from start_hour today regardless of how far off the deadline is.
+        """
         schedule = []
-        base_time = datetime.datetime.now().replace(hour=start_hour, minute=0, second=0, microsecond=0)
-        
+        base_time = get_now().replace(hour=start_hour, minute=0, second=0, microsecond=0)
+
+        # One NumPy broadcast computes every slot offset: rows are study
+        # cycles (2h apart), columns are the study block, its break
+        # (+1h), and its hydration ping (+30min), in seconds.
+        offsets = np.arange(len(topics)).reshape(-1, 1) * 7200 + np.array([0, 3600, 1800])
+        slots = (("study", "Study", None),
+                 ("break", "Break", "🧘 Mandatory AI Break"),
+                 ("hydro", "Health", "💧 Hydration Ping"))
+
         for i, topic in enumerate(topics):
-            # 1. Study Block
-            study_time = base_time + datetime.timedelta(hours=i * 2)
-            schedule.append({
-                "id": f"study_{i}",
-                "Type": "Study",
-                "Topic": topic,
-                "Time": study_time,
-                "DisplayTime": study_time.strftime("%H:%M"),
-                "Status": "Pending",
-                "Reminded": False
-            })
-            
-            # 2. Automated Break (1 hour after study starts)
-            break_time = study_time + datetime.timedelta(hours=1)
-            schedule.append({
-                "id": f"break_{i}",
-                "Type": "Break",
-                "Topic": "🧘 Mandatory AI Break",
-                "Time": break_time,
-                "DisplayTime": break_time.strftime("%H:%M"),
-                "Status": "Pending",
-                "Reminded": False
-            })
-            
-            # 3. Hydration Reminder (every study cycle)
-            hydro_time = study_time + datetime.timedelta(minutes=30)
-            schedule.append({
-                "id": f"hydro_{i}",
-                "Type": "Health",
-                "Topic": "💧 Hydration Ping",
-                "Time": hydro_time,
-                "DisplayTime": hydro_time.strftime("%H:%M"),
-                "Status": "Pending",
-                "Reminded": False
-            })
-            
+            for (prefix, kind, label), off in zip(slots, offsets[i]):
+                slot_time = base_time + datetime.timedelta(seconds=int(off))
+                schedule.append(make_task(f"{prefix}_{i}", kind, label or topic, slot_time))
+
+        # Sort once here; inserts elsewhere use bisect.insort, so the
+        # Live Monitor can rely on chronological order without re-sorting.
+        schedule.sort(key=itemgetter('Ts'))
         return schedule
 
 # --- UI SETUP ---
+# Built once at import so reruns re-emit a ready-made string instead of
+# reconstructing it. (It must still be emitted each rerun: Streamlit
+# drops elements that are not re-declared, so a session-flag guard would
+# lose the styling on the very next tick.)
+PAGE_CSS = """
+<style>
+.ff-metric-grid { display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 12px; }
+.ff-metric-card {
+    background: rgba(255, 255, 255, 0.05);
+    border: 1px solid rgba(128, 128, 128, 0.3);
+    border-radius: 10px;
+    padding: 16px;
+    text-align: center;
+}
+.ff-metric-card .ff-value { font-size: 2em; font-weight: 700; }
+.ff-metric-card .ff-label { opacity: 0.7; }
+.ff-task-card {
+    border: 1px solid rgba(128, 128, 128, 0.3);
+    border-radius: 8px;
+    padding: 10px 14px;
+    margin-bottom: 8px;
+}
+.ff-chip { float: right; font-weight: 700; }
+.ff-chip.done { color: #2ecc71; }
+.ff-chip.missed { color: #e74c3c; }
+</style>
+"""
+
+TASK_ICONS = {"Study": "📚", "Break": "🧘", "Health": "💧", "Work": "💼"}
+CHIP_CLASS = {"Done": "done", "Missed": "missed"}
+
+# Card markup is parsed once at import; reruns only substitute values.
+PENDING_CARD = Template('<div class="ff-task-card">$icon <b>$topic</b> ($time)</div>')
+SETTLED_CARD = Template('<div class="ff-task-card">$icon <b>$topic</b> ($time)'
+                        '<span class="ff-chip $chip">$status</span></div>')
+
+# --- PERSISTENCE ---
+DATA_FILE = "focusflow_data.json"
+
+def save_data():
+    """Snapshot tasks and stats to disk so a browser refresh or redeploy
+    doesn't wipe the day. Written atomically (tmp file + os.replace) so
+    a crash mid-write can't corrupt the store."""
+    payload = {
+        "tasks": [{k: v for k, v in t.items() if k != 'Time'}
+                  for t in st.session_state.tasks],
+        "health_stats": st.session_state.health_stats,
+        "productivity": st.session_state.productivity,
+    }
+    tmp = DATA_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(payload) if orjson else json.dumps(payload).encode())
+    os.replace(tmp, DATA_FILE)
+
+def load_data():
+    """Restore the last snapshot, rebuilding the datetime column from
+    the stored epoch floats. Returns None when there is nothing usable."""
+    try:
+        with open(DATA_FILE, "rb") as f:
+            raw = f.read()
+        payload = orjson.loads(raw) if orjson else json.loads(raw)
+    except (FileNotFoundError, ValueError):
+        return None
+    for t in payload.get("tasks", []):
+        t['Time'] = datetime.datetime.fromtimestamp(t['Ts'], UAE_TZ)
+    return payload
+
 st.set_page_config(page_title="FocusFlow AI", layout="wide", page_icon="🚀")
+st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+# Session task history is bounded like a ring buffer: pending tasks are
+# always kept, settled ones are capped.
+MAX_SETTLED = 100
+
+def _awaiting_event(t):
+    """True while a task can still flip status or fire an alert."""
+    return t['Status'] == "Pending" or (not t['Reminded'] and t['Status'] != "Done")
+
+def refresh_next_due():
+    """Recompute the earliest time any task still needs a status flip or
+    alert. Maintained on mutation so idle reruns get a single O(1)
+    comparison instead of scanning every task."""
+    st.session_state.next_due = min(
+        (t['Ts'] for t in st.session_state.tasks if _awaiting_event(t)),
+        default=float('inf'))
+
+def compact_tasks():
+    """Fused post-mutation pass: drop the oldest settled (Done/Missed)
+    tasks beyond MAX_SETTLED — so a long session can't grow the list
+    without bound — and recompute next_due over the survivors in the
+    same walk."""
+    tasks = st.session_state.tasks
+    overflow = sum(1 for t in tasks if t['Status'] != "Pending") - MAX_SETTLED
+    kept = []
+    nxt = float('inf')
+    for t in tasks:
+        if overflow > 0 and t['Status'] != "Pending":
+            overflow -= 1
+            continue
+        if _awaiting_event(t) and t['Ts'] < nxt:
+            nxt = t['Ts']
+        kept.append(t)
+    st.session_state.tasks = kept
+    st.session_state.next_due = nxt
 
 if 'tasks' not in st.session_state:
     st.session_state.tasks = []
-if 'health_stats' not in st.session_state:
     st.session_state.health_stats = {"water": 0, "breaks": 0}
-if 'productivity' not in st.session_state:
     st.session_state.productivity = {"done": 0, "missed": 0}
+    st.session_state.next_due = float('inf')
+    saved = load_data()
+    if saved:
+        st.session_state.update(saved)
+        refresh_next_due()
 
 # --- JS ALERT & BEEP ---
+# Parsed once at import like the card templates; each alert only
+# substitutes the message.
+ALERT_JS = Template(
+    "<script>"
+    "var audio = new Audio('https://actions.google.com/sounds/v1/alarms/beep_short.ogg');"
+    "audio.play();"
+    "alert($msg);"
+    "</script>")
+
 def trigger_alert(msg):
-    js = f"""
-    <script>
-    var audio = new Audio('https://actions.google.com/sounds/v1/alarms/beep_short.ogg');
-    audio.play();
-    alert("FocusFlow AI: {msg}");
-    </script>
-    """
-    components.html(js, height=0)
+    # json.dumps produces a quoted, escaped JS string literal, so topic
+    # names containing quotes or backslashes can't break out of alert().
+    components.html(ALERT_JS.substitute(msg=json.dumps(f"FocusFlow AI: {msg}")),
+                    height=0)
 
 # --- SIDEBAR NAVIGATION ---
 st.sidebar.title("🚀 FocusFlow AI")
+
+@st.fragment(run_every="1s")
+def clock_fragment():
+    """Seconds-granularity clock isolated in a fragment: only these two
+    lines rerun every second, never the rest of the script."""
+    now = get_now()
+    st.caption(f"🕐 {now.strftime('%H:%M:%S')} UAE")
+
+with st.sidebar:
+    clock_fragment()
+
 menu = st.sidebar.radio("Navigation", ["📚 Study", "💼 Work", "🌿 Health & Stats"])
 
 if st.sidebar.button("🗑️ Reset All Data"):
     st.session_state.tasks = []
     st.session_state.health_stats = {"water": 0, "breaks": 0}
     st.session_state.productivity = {"done": 0, "missed": 0}
+    st.session_state.next_due = float('inf')
+    save_data()
     st.rerun()
 
+# Each section lives in a fragment: button clicks inside one rerun just
+# that section, not the monitor or the rest of the script. Mutations
+# that the Live Monitor must see call st.rerun() (app scope) explicitly.
+
 # --- 1. STUDY SECTION ---
-if menu == "📚 Study":
+@st.fragment
+def study_section():
     st.header("Study Orchestrator")
-    with st.expander("Setup Plan", expanded=True):
+    if 'flash' in st.session_state:
+        st.success(st.session_state.pop('flash'))
+    # Form-batched: edits to the three inputs buffer client-side and
+    # arrive as one rerun on submit, instead of a rerun per keystroke
+    # on the slider/date widgets.
+    with st.expander("Setup Plan", expanded=True), st.form("study_form"):
         t_raw = st.text_area("Topics (comma separated)", "Neural Networks, Logic, Ethics")
-        d_line = st.date_input("Deadline", datetime.date.today() + datetime.timedelta(days=3))
+        d_line = st.date_input("Deadline", get_now().date() + datetime.timedelta(days=3))
         s_hour = st.slider("Start Hour", 0, 23, 9)
-        if st.button("Generate AI Schedule"):
-            t_list = [t.strip() for t in t_raw.split(",") if t.strip()]
+        # Both actions are submit buttons of the same form, so either
+        # click flushes the edited inputs first — a loose button outside
+        # would read the topics as of the *previous* submit.
+        if st.form_submit_button("Generate AI Schedule"):
+            t_list = split_topics(t_raw)
             st.session_state.tasks = FocusFlowAI.generate_full_schedule(t_list, d_line, s_hour)
-            st.success("AI generated Study, Break, and Hydration slots!")
+            refresh_next_due()
+            save_data()
+            st.session_state.flash = "AI generated Study, Break, and Hydration slots!"
+            st.rerun()
+        ask_ai = st.form_submit_button("🧠 Ask Gemini for Study Order")
+
+    if ask_ai:
+        show_study_suggestions(split_topics(t_raw))
 
 # --- 2. WORK SECTION ---
-elif menu == "💼 Work":
+@st.fragment
+def work_section():
     st.header("Work Priority Engine")
     with st.form("work_form"):
         w_task = st.text_input("Task Name")
         w_min = st.number_input("Minutes until due", 1, 120, 15)
         if st.form_submit_button("Add Task"):
-            t_time = datetime.datetime.now() + datetime.timedelta(minutes=w_min)
-            st.session_state.tasks.append({
-                "id": f"work_{time.time()}", "Type": "Work", "Topic": w_task,
-                "Time": t_time, "DisplayTime": t_time.strftime("%H:%M"),
-                "Status": "Pending", "Reminded": False
-            })
+            # Read the clock here, not from a script-level binding: a
+            # fragment rerun executes with globals captured at the last
+            # full run, which can be minutes old once the heartbeat is
+            # unmounted — a stale base would create already-due tasks.
+            t_time = get_now() + datetime.timedelta(minutes=w_min)
+            bisect.insort(st.session_state.tasks,
+                          make_task(f"work_{time.time()}", "Work", w_task, t_time),
+                          key=itemgetter('Ts'))
+            refresh_next_due()
+            save_data()
             st.rerun()
 
 # --- 3. HEALTH & STATS SECTION ---
-elif menu == "🌿 Health & Stats":
+@st.fragment
+def health_section():
     st.header("Wellness & Performance Analytics")
     h = st.session_state.health_stats
     p = st.session_state.productivity
     
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Water Glasses", h['water'])
-    c2.metric("Breaks Taken", h['breaks'])
-    c3.metric("Productivity Score", f"{int((p['done']/(p['done']+p['missed']+1))*100)}%")
+    score = int((p['done'] / (p['done'] + p['missed'] + 1)) * 100)
+    st.markdown(f"""
+    <div class="ff-metric-grid">
+        <div class="ff-metric-card"><div class="ff-value">{h['water']}</div><div class="ff-label">Water Glasses</div></div>
+        <div class="ff-metric-card"><div class="ff-value">{h['breaks']}</div><div class="ff-label">Breaks Taken</div></div>
+        <div class="ff-metric-card"><div class="ff-value">{score}%</div><div class="ff-label">Productivity Score</div></div>
+    </div>
+    """, unsafe_allow_html=True)
     
     st.divider()
     col_a, col_b = st.columns(2)
     with col_a:
         st.subheader("Task Completion")
-        fig, ax = plt.subplots()
-        ax.bar(["Done", "Missed"], [p['done'], p['missed']], color=['#2ecc71', '#e74c3c'])
-        st.pyplot(fig)
+        total = p['done'] + p['missed']
+        st.progress(p['done'] / total if total else 0.0,
+                    text=f"{p['done']}/{total} tasks done")
     with col_b:
         st.subheader("Daily Wellness")
-        fig2, ax2 = plt.subplots()
-        ax2.pie([h['water'], 8], labels=["Drank", "Goal"], colors=['#3498db', '#ecf0f1'])
-        st.pyplot(fig2)
+        st.progress(min(h['water'] / 8, 1.0),
+                    text=f"{h['water']}/8 glasses of water")
+
+if menu == "📚 Study":
+    study_section()
+elif menu == "💼 Work":
+    work_section()
+elif menu == "🌿 Health & Stats":
+    health_section()
 
 # --- LIVE MONITOR (ALERTS & AUTO-MISSED) ---
 st.divider()
 st.subheader("🔔 Live Monitor")
-now = datetime.datetime.now()
+# One raw epoch read per rerun; time.time() and the tasks' aware
+# .timestamp() values share the same epoch scale, so no datetime object
+# or tz conversion is needed on the hot path.
+now_ts = time.time()
+tasks = st.session_state.tasks
+
+# SoA pass: pull the hot columns (due times, flags) into parallel NumPy
+# arrays so the due-checks are two C-level comparisons instead of
+# per-task Python datetime compares inside the render loop. The whole
+# pass is gated on next_due, so idle reruns cost one float compare.
+if tasks and now_ts >= st.session_state.next_due:
+    # All four columns come from one scan. A task flipped to Missed by
+    # the block below still counts as not-done for the reminder mask,
+    # matching the old post-update ordering, since Pending tasks are
+    # not-done either way.
+    times, pending, unreminded, not_done = (np.array(col) for col in zip(
+        *[(t['Ts'], t['Status'] == "Pending", not t['Reminded'], t['Status'] != "Done")
+          for t in tasks]))
+
+    alerts = []
 
-for i, task in enumerate(st.session_state.tasks):
     # AUTO-MISSED LOGIC
-    if now > task['Time'] and task['Status'] == "Pending":
-        st.session_state.tasks[i]['Status'] = "Missed"
+    for i in np.flatnonzero(pending & (now_ts > times)):
+        tasks[i]['Status'] = "Missed"
         st.session_state.productivity['missed'] += 1
-        trigger_alert(f"MISSED: {task['Topic']}")
+        alerts.append(f"MISSED: {tasks[i]['Topic']}")
 
     # REMINDER LOGIC
-    if now >= task['Time'] and not task['Reminded'] and task['Status'] != "Done":
-        st.session_state.tasks[i]['Reminded'] = True
-        trigger_alert(f"TIME TO START: {task['Topic']}")
-
-    # RENDER TASKS
-    with st.container(border=True):
-        c_icon, c_info, c_act = st.columns([1, 4, 2])
-        icons = {"Study": "📚", "Break": "🧘", "Health": "💧", "Work": "💼"}
-        c_icon.write(f"### {icons.get(task['Type'], '📌')}")
-        c_info.write(f"**{task['Topic']}** ({task['DisplayTime']})")
-        
-        if task['Status'] == "Pending":
-            if c_act.button("Mark Done ✅", key=f"btn_{task['id']}"):
-                st.session_state.tasks[i]['Status'] = "Done"
+    for i in np.flatnonzero(unreminded & not_done & (now_ts >= times)):
+        tasks[i]['Reminded'] = True
+        alerts.append(f"TIME TO START: {tasks[i]['Topic']}")
+
+    # One component emission no matter how many tasks fired this tick.
+    if alerts:
+        trigger_alert(" | ".join(alerts))
+
+    compact_tasks()
+    save_data()
+
+# RENDER TASKS: all cards are concatenated into a single st.markdown
+# emission — one element and one websocket frame per rerun — since the
+# only interactive widgets are the two in the completion form below.
+pending_tasks = []
+cards = []
+for task in st.session_state.tasks:
+    icon = TASK_ICONS.get(task['Type'], '📌')
+    # Topics come from free-text inputs and the blob is emitted with
+    # unsafe_allow_html, so they must be escaped here — same class of
+    # hole the alert path closes with json.dumps.
+    topic = html.escape(task['Topic'])
+    if task['Status'] == "Pending":
+        pending_tasks.append(task)
+        cards.append(PENDING_CARD.substitute(
+            icon=icon, topic=topic, time=task['DisplayTime']))
+    else:
+        cards.append(SETTLED_CARD.substitute(
+            icon=icon, topic=topic, time=task['DisplayTime'],
+            chip=CHIP_CLASS[task['Status']], status=task['Status']))
+if cards:
+    st.markdown("\n".join(cards), unsafe_allow_html=True)
+
+if pending_tasks:
+    # Options are stable task ids, not row objects: the widget's
+    # selection survives the list shifting between reruns (a task going
+    # Missed above must not silently retarget the selection), and the
+    # submit handler is a dict hit instead of any search.
+    by_id = {t['id']: t for t in pending_tasks}
+    with st.form("complete_form"):
+        chosen = st.multiselect(
+            "Tasks to complete", list(by_id),
+            format_func=lambda i: f"{by_id[i]['Topic']} ({by_id[i]['DisplayTime']})")
+        if st.form_submit_button("Mark Done ✅") and chosen:
+            for cid in chosen:
+                done = by_id[cid]
+                done['Status'] = "Done"
                 st.session_state.productivity['done'] += 1
-                if task['Type'] == "Health": st.session_state.health_stats['water'] += 1
-                if task['Type'] == "Break": st.session_state.health_stats['breaks'] += 1
-                st.rerun()
-        else:
-            clr = "green" if task['Status'] == "Done" else "red"
-            c_act.markdown(f":{clr}[**{task['Status']}**]")
+                if done['Type'] == "Health": st.session_state.health_stats['water'] += 1
+                if done['Type'] == "Break": st.session_state.health_stats['breaks'] += 1
+            compact_tasks()
+            save_data()
+            st.rerun()
+
+# Heartbeat: no polling at all while nothing can come due; otherwise
+# sleep until just past the next event (1s floor, 60s ceiling) instead
+# of rerunning on a fixed fast tick. The 250ms pad makes the rerun land
+# after the due instant, so one tick fires the event rather than one
+# tick arriving a hair early plus a second one to actually fire it.
+if st.session_state.next_due != float('inf'):
+    wait_ms = int((st.session_state.next_due - time.time()) * 1000) + 250
+    st_autorefresh(interval=max(1000, min(60000, wait_ms)), key="ff_heartbeat")
 
 st.button("🔄 Refresh System Clock")
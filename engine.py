@@ -1,27 +1,65 @@
 import google.generativeai as genai
 import os
+from string import Template
+
+# Prompt skeleton parsed once at import; each call only substitutes the
+# topic list.
+_BREAKDOWN_PROMPT = Template("""
+        Act as a study coach. I have these topics to study: $topics.
+        1. Organize them in the most logical learning order.
+        2. Briefly explain why this order works.
+        3. Identify which topic might be the 'Deep Work' focus.
+        Keep the response concise and formatted for a desktop app.
+        """)
 
 class FocusFlowEngine:
+    __slots__ = ("api_key", "model")
+
+    # Openings of the messages the no-key and except paths below
+    # produce; lets callers tell a real answer from a failure message.
+    _ERROR_PREFIXES = ("API Key not provided", "Error connecting to Gemini:")
+
+    @classmethod
+    def is_error_chunk(cls, chunk):
+        return chunk.startswith(cls._ERROR_PREFIXES)
+
     def __init__(self, api_key=None):
         self.api_key = api_key
         if api_key:
             genai.configure(api_key=api_key)
             self.model = genai.GenerativeModel('gemini-1.5-flash')
+        else:
+            self.model = None
+
+    @staticmethod
+    def _breakdown_prompt(topics):
+        # Callers pass either a ready string or a sequence of topic
+        # names; join the latter so the model sees "A, B, C" rather
+        # than a Python tuple repr.
+        if not isinstance(topics, str):
+            topics = ", ".join(topics)
+        return _BREAKDOWN_PROMPT.substitute(topics=topics)
 
     def get_ai_breakdown(self, topics):
         """Uses Gemini to organize topics by logical difficulty/order."""
         if not self.api_key:
             return "API Key not provided. Using default order."
 
-        prompt = f"""
-        Act as a study coach. I have these topics to study: {topics}.
-        1. Organize them in the most logical learning order.
-        2. Briefly explain why this order works.
-        3. Identify which topic might be the 'Deep Work' focus.
-        Keep the response concise and formatted for a desktop app.
-        """
         try:
-            response = self.model.generate_content(prompt)
+            response = self.model.generate_content(self._breakdown_prompt(topics))
             return response.text
         except Exception as e:
             return f"Error connecting to Gemini: {str(e)}"
+
+    def stream_ai_breakdown(self, topics):
+        """Same breakdown, yielded in chunks so the UI can render tokens
+        as they arrive instead of blocking on the full response."""
+        if not self.api_key:
+            yield "API Key not provided. Using default order."
+            return
+
+        try:
+            for chunk in self.model.generate_content(self._breakdown_prompt(topics), stream=True):
+                yield chunk.text
+        except Exception as e:
+            yield f"Error connecting to Gemini: {str(e)}"